@@ -18,36 +18,28 @@
 from textwrap import dedent
 
 
+_HEADER_TEMPLATE = dedent("""\
+    <style type="text/css">
+        #%(chart_name)s {
+            width: %(width)dpx;
+            height: %(height)dpx;
+        }
+    </style>
+    <script src="http://yui.yahooapis.com/3.17.2/build/yui/yui-min.js">
+    </script>
+    """)
+
+
 def make_chart_header(chart_name="chart", width=960, height=550):
     """Return HTML to declare the chart style and load YUI.
 
     This should be included in the <head> element.
     """
     params = {"chart_name": chart_name, "width": width, "height": height}
-    return dedent("""\
-        <style type="text/css">
-            #%(chart_name)s {
-                width: %(width)dpx;
-                height: %(height)dpx;
-            }
-        </style>
-        <script src="http://yui.yahooapis.com/3.17.2/build/yui/yui-min.js">
-        </script>
-        """) % params
+    return _HEADER_TEMPLATE % params
 
 
-def make_chart(source, keys, chart_name="chart"):
-    """Return HTML to render a chart."""
-    params = {
-        "source": source,
-        "chart_name": chart_name,
-        "series_keys": ", ".join('"%s"' % key for key in keys),
-        "series_styles": ", ".join(
-            '"%s": { line: { weight: "2mm" } }' % key for key in keys),
-        "series_schema_fields": ", ".join(
-            '{key: "%s", parser: parseNum}' % key for key in keys),
-        }
-    return dedent("""\
+_CHART_TEMPLATE = dedent("""\
         <div id="%(chart_name)s"></div>
         <script>
         YUI().use(['charts-legend', 'datasource'], function (Y) {
@@ -100,4 +92,23 @@ def make_chart(source, keys, chart_name="chart"):
                 }}});
         });
         </script>
-        """) % params
+        """)
+
+
+def make_chart(source, keys, chart_name="chart"):
+    """Return HTML to render a chart."""
+    series_keys = []
+    series_styles = []
+    series_schema_fields = []
+    for key in keys:
+        series_keys.append('"%s"' % key)
+        series_styles.append('"%s": { line: { weight: "2mm" } }' % key)
+        series_schema_fields.append('{key: "%s", parser: parseNum}' % key)
+    params = {
+        "source": source,
+        "chart_name": chart_name,
+        "series_keys": ", ".join(series_keys),
+        "series_styles": ", ".join(series_styles),
+        "series_schema_fields": ", ".join(series_schema_fields),
+        }
+    return _CHART_TEMPLATE % params
@@ -36,24 +36,46 @@ except ImportError:
 from qatracker import QATracker, QATrackerMilestone, QATrackerProduct
 import os
 
+# Resolved once; constructing trackers in a loop should not keep
+# re-expanding and re-statting paths under the home directory.
+_CONFIG_PATH = os.path.expanduser('~/.isotracker.conf')
+_NOTE_PATH = os.path.expanduser('~/.isotracker.note')
+
 class NoConfigurationError(Exception):
     pass
 
 
+# Parsed configuration cache, keyed by path and invalidated on
+# mtime/size change, so constructing several trackers only reads the
+# configuration file once.
+_config_cache = {}
+
+
+def _load_config(path):
+    st = os.stat(path)
+    key = (path, st.st_mtime, st.st_size)
+    cached = _config_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    config = configparser.ConfigParser()
+    config.read([path])
+    _config_cache[path] = (key, config)
+    return config
+
+
 class ISOTracker:
     def __init__(self, target=None):
         # Store the alternative target (configuration section)
         self.target = target
 
         # Read configuration
-        configfile = os.path.expanduser('~/.isotracker.conf')
+        configfile = _CONFIG_PATH
         if not os.path.exists(configfile):
             raise NoConfigurationError(
                 "Missing configuration file at: %s" % configfile)
 
         # Load the config
-        self.config = configparser.ConfigParser()
-        self.config.read([configfile])
+        self.config = _load_config(configfile)
 
         # Connect to the tracker
         url = self.config.get('general', 'url')
@@ -75,9 +97,17 @@ class ISOTracker:
 
         self.qatracker = QATracker(url, username, password)
 
-        # Get the required list of products and milestones
-        self.tracker_products = self.qatracker.get_products()
-        self.tracker_milestones = self.qatracker.get_milestones()
+        # Get the required list of products and milestones in a single
+        # batched request
+        batch = self.qatracker.get_all()
+        self.tracker_products = batch['products']
+        self.tracker_milestones = batch['milestones']
+
+        # Index them by lowercase title for constant-time name lookups
+        self._products_by_name = dict(
+            (entry.title.lower(), entry) for entry in self.tracker_products)
+        self._milestones_by_name = dict(
+            (entry.title.lower(), entry) for entry in self.tracker_milestones)
 
     def default_milestone(self):
         """
@@ -114,10 +144,9 @@ class ISOTracker:
             Get a QATrackerProduct from the product's name.
         """
 
-        for entry in self.tracker_products:
-            if entry.title.lower() == product.lower():
-                return entry
-        else:
+        try:
+            return self._products_by_name[product.lower()]
+        except KeyError:
             raise KeyError("Product '%s' not found" % product)
 
     def get_milestone_by_name(self, milestone):
@@ -125,10 +154,9 @@ class ISOTracker:
             Get a QATrackerMilestone from the milestone's name.
         """
 
-        for entry in self.tracker_milestones:
-            if entry.title.lower() == milestone.lower():
-                return entry
-        else:
+        try:
+            return self._milestones_by_name[milestone.lower()]
+        except KeyError:
             raise KeyError("Milestone '%s' not found" % milestone)
 
     def get_builds(self, milestone=None,
@@ -153,7 +181,7 @@ class ISOTracker:
         if not isinstance(product, QATrackerProduct):
             product = self.get_product_by_name(product)
 
-        notefile = os.path.expanduser('~/.isotracker.note')
+        notefile = _NOTE_PATH
         if note == "" and os.path.exists(notefile):
             with open(notefile, 'r') as notefd:
                 note = notefd.read()
@@ -6,8 +6,37 @@ try:
 except ImportError:
     from urllib2 import urlopen
 
+import copy
+import hashlib
+import json
 import os
+import sys
+import threading
+
+try:
+    from functools import cached_property
+except ImportError:
+    # Python 2: no caching, plain property semantics.
+    cached_property = property
+
 import yaml
+try:
+    # The libyaml-backed loader is substantially faster when available.
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# The hyphenated YAML keys are not identifier-like, so CPython does not
+# intern them automatically; intern them once so hot dict lookups get the
+# identity-compare fast path.
+_K_PUBLISH_TO = sys.intern('publish-to')
+_K_PROMOTE_TO = sys.intern('promote-to')
+_K_HW_CERT = sys.intern('hw-cert')
+_K_SEVERE_ONLY = sys.intern('severe-only')
+_K_DERIVED_FROM = sys.intern('derived-from')
+_K_COPY_FORWARD = sys.intern('copy-forward')
+_K_INVALID_TASKS = sys.intern('invalid-tasks')
+_K_ROUTING_TABLE = sys.intern('routing-table')
 
 class KernelRoutingEntry:
     def __init__(self, ks, source, data):
@@ -23,10 +52,11 @@ class KernelRoutingEntry:
                                  "not listed in series routing table".format(data))
             data = table[data]
 
-        # Clear out any entries that have been overriden to None.
-        for entry in dict(data):
-            if data[entry] is None:
-                del data[entry]
+        # Clear out any entries that have been overriden to None, leaving
+        # the caller's dict untouched.
+        if data:
+            data = dict((entry, value) for entry, value in data.items()
+                        if value is not None)
 
         self._ks = ks
         self._source = source
@@ -42,9 +72,9 @@ class KernelRoutingEntry:
         return self._name
 
     def __eq__(self, other):
-        if isinstance(self, other.__class__):
-            return list(self) == list(other)
-        return False
+        if type(self) is not type(other):
+            return False
+        return self._data == other._data
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -86,9 +116,9 @@ class KernelRepoEntry:
     # XXX: should this object have a name ?
 
     def __eq__(self, other):
-        if isinstance(self, other.__class__):
-            return self.url == other.url and self.branch == other.branch
-        return False
+        if type(self) is not type(other):
+            return False
+        return self.url == other.url and self.branch == other.branch
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -105,6 +135,16 @@ class KernelRepoEntry:
         return "{} {}".format(self.url, self.branch)
 
 
+# Expansion of a promote-to risk level into the full list of risks up to
+# and including it.
+_PROMOTE_EXPANSION = {
+    'edge':      ['edge'],
+    'beta':      ['edge', 'beta'],
+    'candidate': ['edge', 'beta', 'candidate'],
+    'stable':    ['edge', 'beta', 'candidate', 'stable'],
+}
+
+
 class KernelSnapEntry:
     def __init__(self, ks, source, name, data):
         self._ks = ks
@@ -113,39 +153,36 @@ class KernelSnapEntry:
         self._data = data if data else {}
 
         # Convert arches/track to publish-to form.
-        if 'publish-to' not in self._data:
+        if _K_PUBLISH_TO not in self._data:
             if 'arches' in self._data:
                 publish_to = {}
                 for arch in self._data['arches']:
                     publish_to[arch] = [self._data.get('track', 'latest')]
-                self._data['publish-to'] = publish_to
+                self._data[_K_PUBLISH_TO] = publish_to
 
         # Convert stable to promote-to form.
-        if 'promote-to' not in self._data and 'stable' in self._data:
+        if _K_PROMOTE_TO not in self._data and 'stable' in self._data:
             if self._data['stable'] is True:
-                self._data['promote-to'] = 'stable'
+                self._data[_K_PROMOTE_TO] = 'stable'
             else:
-                self._data['promote-to'] = 'candidate'
+                self._data[_K_PROMOTE_TO] = 'candidate'
         # Assume no promote-to data to mean just to edge.
-        promote_to = self._data.get('promote-to', 'edge')
+        promote_to = self._data.get(_K_PROMOTE_TO, 'edge')
         if isinstance(promote_to, str):
-            expand_promote_to = []
-            for risk in ('edge', 'beta', 'candidate', 'stable'):
-                expand_promote_to.append(risk)
-                if risk == promote_to:
-                    break
-            self._data['promote-to'] = expand_promote_to
+            # Unknown risks expand to the full list, as the old scan did.
+            self._data[_K_PROMOTE_TO] = list(_PROMOTE_EXPANSION.get(
+                promote_to, _PROMOTE_EXPANSION['stable']))
         # Ensure we have stable when promote-to is present.
-        if 'promote-to' in self._data and 'stable' not in self._data:
-            if 'stable' in self._data['promote-to']:
+        if _K_PROMOTE_TO in self._data and 'stable' not in self._data:
+            if 'stable' in self._data[_K_PROMOTE_TO]:
                 self._data['stable'] = True
             else:
                 self._data['stable'] = False
 
     def __eq__(self, other):
-        if isinstance(self, other.__class__):
-            return self.name == other.name and self.source == other.source
-        return False
+        if type(self) is not type(other):
+            return False
+        return self.name == other.name and self.source == other.source
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -162,7 +199,7 @@ class KernelSnapEntry:
     def name(self):
         return self._name
 
-    @property
+    @cached_property
     def repo(self):
         data = self._data.get('repo', None)
         if not data:
@@ -187,7 +224,7 @@ class KernelSnapEntry:
 
     @property
     def hw_cert(self):
-        return self._data.get('hw-cert', False)
+        return self._data.get(_K_HW_CERT, False)
 
     @property
     def arches(self):
@@ -200,14 +237,14 @@ class KernelSnapEntry:
 
     @property
     def publish_to(self):
-        return self._data.get('publish-to', None)
+        return self._data.get(_K_PUBLISH_TO, None)
 
     @property
     def promote_to(self):
-        return self._data.get('promote-to', None)
+        return self._data.get(_K_PROMOTE_TO, None)
 
     def promote_to_risk(self, risk):
-        return risk in self._data.get('promote-to', [])
+        return risk in self._data.get(_K_PROMOTE_TO, [])
 
     def __str__(self):
         return "{} {}".format(str(self.source), self.name)
@@ -221,9 +258,9 @@ class KernelPackageEntry:
         self._data = data if data else {}
 
     def __eq__(self, other):
-        if isinstance(self, other.__class__):
-            return self.name == other.name and self.source == other.source
-        return False
+        if type(self) is not type(other):
+            return False
+        return self.name == other.name and self.source == other.source
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -244,7 +281,7 @@ class KernelPackageEntry:
     def type(self):
         return self._data.get('type', None)
 
-    @property
+    @cached_property
     def repo(self):
         data = self._data.get('repo', None)
         if not data:
@@ -261,11 +298,13 @@ class KernelSourceEntry:
         self._series = series
         self._name = name
         self._data = data if data else {}
+        self._package_cache = {}
+        self._snap_cache = {}
 
     def __eq__(self, other):
-        if isinstance(self, other.__class__):
-            return self.name == other.name and self.series == other.series
-        return False
+        if type(self) is not type(other):
+            return False
+        return self.name == other.name and self.series == other.series
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -278,7 +317,7 @@ class KernelSourceEntry:
     def series(self):
         return self._series
 
-    @property
+    @cached_property
     def versions(self):
         if 'versions' in self._data:
             return self._data['versions']
@@ -294,124 +333,117 @@ class KernelSourceEntry:
         # XXX: should this be []
         return None
 
-    @property
+    @cached_property
     def version(self):
         versions = self.versions
         if not versions:
             return None
         return versions[-1]
 
-    @property
+    @cached_property
     def development(self):
         return self._data.get('development', self.series.development)
 
-    @property
+    @cached_property
     def supported(self):
         return self._data.get('supported', self.series.supported)
 
-    @property
+    @cached_property
     def severe_only(self):
-        return self._data.get('severe-only', False)
+        return self._data.get(_K_SEVERE_ONLY, False)
 
-    @property
+    @cached_property
     def stakeholder(self):
         return self._data.get('stakeholder', None)
 
-    @property
+    @cached_property
     def packages(self):
         # XXX: should this return None when empty
-        result = []
-        packages = self._data.get('packages')
-        if packages:
-            for package_key, package in packages.items():
-                result.append(KernelPackageEntry(self._ks, self, package_key, package))
-        return result
+        packages = self._data.get('packages') or {}
+        return [self.lookup_package(package_key) for package_key in packages]
 
     def lookup_package(self, package_key):
+        if package_key in self._package_cache:
+            return self._package_cache[package_key]
         packages = self._data.get('packages')
         if not packages or package_key not in packages:
             return None
-        return KernelPackageEntry(self._ks, self, package_key, packages[package_key])
+        entry = KernelPackageEntry(self._ks, self, package_key,
+                                   packages[package_key])
+        self._package_cache[package_key] = entry
+        return entry
 
-    @property
+    @cached_property
     def snaps(self):
         # XXX: should this return None when empty
-        result = []
-        snaps = self._data.get('snaps')
-        if snaps:
-            for snap_key, snap in snaps.items():
-                result.append(KernelSnapEntry(self._ks, self, snap_key, snap))
-        return result
+        snaps = self._data.get('snaps') or {}
+        return [self.lookup_snap(snap_key) for snap_key in snaps]
 
     def lookup_snap(self, snap_key):
+        if snap_key in self._snap_cache:
+            return self._snap_cache[snap_key]
         snaps = self._data.get('snaps')
         if not snaps or snap_key not in snaps:
             return None
-        return KernelSnapEntry(self._ks, self, snap_key, snaps[snap_key])
+        entry = KernelSnapEntry(self._ks, self, snap_key, snaps[snap_key])
+        self._snap_cache[snap_key] = entry
+        return entry
 
-    @property
+    @cached_property
     def derived_from(self):
-        if 'derived-from' not in self._data:
+        if _K_DERIVED_FROM not in self._data:
             return None
 
-        (series_key, source_key) = self._data['derived-from']
+        (series_key, source_key) = self._data[_K_DERIVED_FROM]
 
         series = self._ks.lookup_series(series_key)
         source = series.lookup_source(source_key)
 
         return source
 
-    @property
+    @cached_property
     def testable_flavours(self):
-        retval = []
-        if (self._data.get('testing') is not None and
-                self._data['testing'].get('flavours') is not None
-           ):
-            for flavour in self._data['testing']['flavours'].keys():
-                fdata = self._data['testing']['flavours'][flavour]
-                # If we have neither arches nor clouds we represent a noop
-                if not fdata:
-                    continue
-                arches = fdata.get('arches', None)
-                arches = arches if arches is not None else []
-                clouds = fdata.get('clouds', None)
-                clouds = clouds if clouds is not None else []
-                retval.append(KernelSourceTestingFlavourEntry(flavour, arches, clouds))
-        return retval
-
-    @property
+        testing = self._data.get('testing') or {}
+        flavours = testing.get('flavours') or {}
+        # Flavours with neither arches nor clouds represent a noop.
+        return [KernelSourceTestingFlavourEntry(flavour,
+                                                fdata.get('arches') or [],
+                                                fdata.get('clouds') or [])
+                for flavour, fdata in flavours.items() if fdata]
+
+    @cached_property
     def invalid_tasks(self):
-        retval = self._data.get('invalid-tasks', [])
+        retval = self._data.get(_K_INVALID_TASKS, [])
         if retval is None:
             retval = []
         return retval
 
-    @property
+    @cached_property
     def copy_forward(self):
-        if 'copy-forward' not in self._data:
+        if _K_COPY_FORWARD not in self._data:
             return None
 
         # XXX: backwards compatibility.
-        if self._data['copy-forward'] is False:
+        if self._data[_K_COPY_FORWARD] is False:
             return None
-        if self._data['copy-forward'] is True:
+        if self._data[_K_COPY_FORWARD] is True:
             derived_from = self.derived_from
             if derived_from is None:
                 return True
             return self.derived_from
 
-        (series_key, source_key) = self._data['copy-forward']
+        (series_key, source_key) = self._data[_K_COPY_FORWARD]
 
         series = self._ks.lookup_series(series_key)
         source = series.lookup_source(source_key)
 
         return source
 
-    @property
+    @cached_property
     def backport(self):
         return self._data.get('backport', False)
 
-    @property
+    @cached_property
     def routing(self):
         default = 'default'
         if self.series.development:
@@ -423,11 +455,11 @@ class KernelSourceEntry:
             return data
         return KernelRoutingEntry(self._ks, self, data)
 
-    @property
+    @cached_property
     def swm_data(self):
         return self._data.get('swm')
 
-    @property
+    @cached_property
     def private(self):
         return self._data.get('private', False)
 
@@ -456,16 +488,25 @@ class KernelSeriesEntry:
     def __init__(self, ks, name, data, defaults=None):
         self._ks = ks
         self._name = name
-        self._data = {}
-        if defaults is not None:
-            self._data.update(defaults)
-        if data is not None:
-            self._data.update(data)
+        # Keep the defaults and the per-series data separate rather than
+        # merging them up front; most entries only ever have a key or two
+        # read from them.
+        self._defaults = defaults if defaults else {}
+        self._override = data if data else {}
+        self._source_cache = {}
+
+    def _has(self, key):
+        return key in self._override or key in self._defaults
+
+    def _get(self, key, default=None):
+        if key in self._override:
+            return self._override[key]
+        return self._defaults.get(key, default)
 
     def __eq__(self, other):
-        if isinstance(self, other.__class__):
-            return self.name == other.name
-        return False
+        if type(self) is not type(other):
+            return False
+        return self.name == other.name
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -474,21 +515,21 @@ class KernelSeriesEntry:
     def name(self):
         return self._name
 
-    @property
+    @cached_property
     def codename(self):
-        return self._data.get('codename', None)
+        return self._get('codename', None)
 
     @property
     def opening(self):
-        if 'opening' in self._data:
-            if self._data['opening'] is not False:
+        if self._has('opening'):
+            if self._get('opening') is not False:
                 return True
         return False
 
     def opening_ready(self, *flags):
-        if 'opening' not in self._data:
+        if not self._has('opening'):
             return True
-        allow = self._data['opening']
+        allow = self._get('opening')
         if allow is None:
             return False
         if allow in (True, False):
@@ -500,44 +541,44 @@ class KernelSeriesEntry:
         return True
     opening_allow = opening_ready
 
-    @property
+    @cached_property
     def development(self):
-        return self._data.get('development', False)
+        return self._get('development', False)
 
-    @property
+    @cached_property
     def supported(self):
-        return self._data.get('supported', False)
+        return self._get('supported', False)
 
-    @property
+    @cached_property
     def lts(self):
-        return self._data.get('lts', False)
+        return self._get('lts', False)
 
-    @property
+    @cached_property
     def esm(self):
-        return self._data.get('esm', False)
+        return self._get('esm', False)
 
     def __str__(self):
         return "{} ({})".format(self.name, self.codename)
 
-    @property
+    @cached_property
     def sources(self):
-        result = []
-        sources = self._data.get('sources')
-        if sources:
-            for source_key, source in sources.items():
-                result.append(KernelSourceEntry(
-                    self._ks, self, source_key, source))
-        return result
+        sources = self._get('sources') or {}
+        return [self.lookup_source(source_key) for source_key in sources]
 
     @property
     def routing_table(self):
-        return self._data.get('routing-table', None)
+        return self._get(_K_ROUTING_TABLE, None)
 
     def lookup_source(self, source_key):
-        sources = self._data.get('sources')
+        if source_key in self._source_cache:
+            return self._source_cache[source_key]
+        sources = self._get('sources')
         if not sources or source_key not in sources:
             return None
-        return KernelSourceEntry(self._ks, self, source_key, sources[source_key])
+        entry = KernelSourceEntry(self._ks, self, source_key,
+                                  sources[source_key])
+        self._source_cache[source_key] = entry
+        return entry
 
 
 # KernelSeries
@@ -550,27 +591,65 @@ class KernelSeries:
     #_url = 'file:///home/apw/git2/kteam-tools/info/kernel-series.yaml'
     #_url = 'file:///home/work/kteam-tools/info/kernel-series.yaml'
     _data_txt = {}
+    _data_parsed = {}
+    _data_lock = threading.Lock()
+
+    @classmethod
+    def __parse_once(cls, data):
+        if not os.getenv("USE_KERNEL_SERIES_JSON_CACHE", False):
+            return yaml.load(data, Loader=_YamlLoader)
+
+        # Opt-in on-disk cache: the YAML contains only plain mappings,
+        # lists and scalars, so a JSON rendering of the parsed structure
+        # round-trips exactly and json.load is far faster than any YAML
+        # parse.  Content-hash the text so a changed file misses cleanly.
+        cache_dir = (os.environ.get('XDG_CACHE_HOME') or
+                     os.path.expanduser('~/.cache'))
+        digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+        cache_path = os.path.join(cache_dir,
+                                  'kernel-series.%s.json' % digest)
+        try:
+            with open(cache_path) as cached:
+                return json.load(cached)
+        except (IOError, OSError, ValueError):
+            pass
+        parsed = yaml.load(data, Loader=_YamlLoader)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            cache_tmp = '%s.%d' % (cache_path, os.getpid())
+            with open(cache_tmp, 'w') as cached:
+                json.dump(parsed, cached)
+            os.rename(cache_tmp, cache_path)
+        except (IOError, OSError):
+            pass
+        return parsed
 
     @classmethod
     def __load_once(cls, url):
-        if url not in cls._data_txt:
-            response = urlopen(url)
-            data = response.read()
-            if not isinstance(data, str):
-                data = data.decode('utf-8')
-            cls._data_txt[url] = data
+        with cls._data_lock:
+            if url not in cls._data_txt:
+                response = urlopen(url)
+                data = response.read()
+                if not isinstance(data, str):
+                    data = data.decode('utf-8')
+                cls._data_txt[url] = data
+                # Parse once per URL; __init__ mutates the result so hand
+                # out deep copies rather than the cached structure itself.
+                cls._data_parsed[url] = cls.__parse_once(data)
         return cls._data_txt[url]
 
     def __init__(self, url=None, data=None, use_local=os.getenv("USE_LOCAL_KERNEL_SERIES_YAML", False)):
-        if data or url:
-            if url:
-                response = urlopen(url)
-                data = response.read()
+        if data is None:
+            # All URL loads (explicit or default) go via the cache.
+            if not url:
+                url = self._url_local if use_local else self._url
+            self.__load_once(url)
+            self._data = copy.deepcopy(self._data_parsed[url])
+        else:
             if not isinstance(data, str):
                 data = data.decode('utf-8')
-        else:
-            data = self.__load_once(self._url_local if use_local else self._url)
-        self._data = yaml.safe_load(data)
+            self._data = yaml.load(data, Loader=_YamlLoader)
 
         self._development_series = None
         self._codename_to_series = {}
@@ -588,31 +667,44 @@ class KernelSeries:
             self._defaults_series = self._data['defaults']
             del self._data['defaults']
 
+        # Build the series entries once; series/lookup_series hand out
+        # these shared objects rather than re-wrapping the raw data.
+        self._series_by_key = dict(
+            (series_key, KernelSeriesEntry(self, series_key, series,
+                                           defaults=self._defaults_series))
+            for series_key, series in self._data.items())
+
     @staticmethod
     def key_series_name(series):
         return [int(x) for x in series.name.split('.')]
 
     @property
     def series(self):
-        return [KernelSeriesEntry(self, series_key, series,
-                defaults=self._defaults_series)
-                for series_key, series in self._data.items()]
+        return list(self._series_by_key.values())
+
+    def preload(self):
+        # Materialise the whole series/source/package/snap tree in one
+        # linear pass; with the cached properties every later traversal
+        # is then a pure dict read.
+        for series in self.series:
+            for source in series.sources:
+                source.packages
+                source.snaps
+                source.routing
+        return self
 
     def lookup_series(self, series=None, codename=None, development=False):
-        if not series and not codename and not development:
-            raise ValueError("series/codename/development required")
         if not series and codename:
-            if codename not in self._codename_to_series:
+            series = self._codename_to_series.get(codename)
+            if not series:
                 return None
-            series = self._codename_to_series[codename]
         if not series and development:
-            if not self._development_series:
-                return None
             series = self._development_series
-        if series and series not in self._data:
-            return None
-        return KernelSeriesEntry(self, series, self._data[series],
-                                 defaults=self._defaults_series)
+            if not series:
+                return None
+        if not series:
+            raise ValueError("series/codename/development required")
+        return self._series_by_key.get(series)
 
 
 if __name__ == '__main__':
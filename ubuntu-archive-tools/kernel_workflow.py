@@ -16,21 +16,36 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import functools
 import re
 import sys
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 
 class KernelWorkflowError(Exception):
     """An exception occurred with the state of the workflow bug"""
 
 
+_PREP_RE = re.compile(r'prepare-package(?P<subpackage>.*)')
+_TITLE_RE = re.compile(
+    r'^([a-z]+\/)?(?P<package>[a-z0-9.-]+): '
+    + '(?P<version>[0-9.-]+[0-9a-z.~-]*)'
+    + ' -proposed tracker$')
+
+
+@functools.lru_cache(maxsize=8)
+def _build_target_res(root_uri):
+    """Compile the bug-target regexes for a Launchpad root URI once."""
+    package_re = re.compile(
+        (r'^%subuntu/(?P<release>[0-9a-z.-]+)/'
+         + '\+source/(?P<package>[a-z0-9.-]+)$') % root_uri)
+    workflow_re = re.compile(
+        r'^%skernel-sru-workflow/(?P<subtask>.*)' % root_uri)
+    return package_re, workflow_re
+
+
 def get_name_and_version_from_bug(bug):
-    title_re = re.compile(
-        r'^([a-z]+\/)?(?P<package>[a-z0-9.-]+): '
-        + '(?P<version>[0-9.-]+[0-9a-z.~-]*)'
-        + ' -proposed tracker$')
-    match = title_re.search(bug.title)
+    match = _TITLE_RE.search(bug.title)
     if not match:
         print("Ignoring bug %s, not a kernel SRU tracking bug" % bug.id)
         return (None, None)
@@ -44,12 +59,7 @@ def process_sru_bug(lp, bugnum, task_callback, source_callback, context=None):
     """Process the indicated bug and call the provided helper functions
     as needed
     """
-    package_re = re.compile(
-        (r'^%subuntu/(?P<release>[0-9a-z.-]+)/'
-         + '\+source/(?P<package>[a-z0-9.-]+)$') % str(lp._root_uri))
-    workflow_re = re.compile(
-        r'^%skernel-sru-workflow/(?P<subtask>.*)' % str(lp._root_uri))
-    prep_re = re.compile(r'prepare-package(?P<subpackage>.*)')
+    package_re, workflow_re = _build_target_res(str(lp._root_uri))
 
     packages = []
     source_name = None
@@ -62,22 +72,32 @@ def process_sru_bug(lp, bugnum, task_callback, source_callback, context=None):
         return
 
     task_results = {}
-    for task in bug.bug_tasks:
+    # Materializing status/target for each task is an independent REST
+    # GET; prefetch them in parallel and keep the callbacks (which may
+    # mutate state) on this thread.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        task_info = list(pool.map(
+            lambda task: (task, task.status, str(task.target)),
+            bug.bug_tasks))
+    for task, status, target in task_info:
         # If a task is set to invalid, we do not care about it
-        if task.status == 'Invalid':
+        if status == 'Invalid':
             continue
 
-        # FIXME: ok not exactly what we want, we probably want a hash?
-        task_results.update(task_callback(lp, bugnum, task, context))
-        task_match = workflow_re.search(str(task.target))
+        task_match = workflow_re.search(target)
         if task_match:
+            # The callbacks only act on workflow subtasks, so the cheap
+            # target match gates the (potentially expensive) callback.
+            # FIXME: ok not exactly what we want, we probably want a hash?
+            task_results.update(task_callback(lp, bugnum, task, context))
             subtask = task_match.group('subtask')
             # FIXME: consolidate subtask / prep_match here
-            prep_match = prep_re.search(subtask)
+            prep_match = _PREP_RE.search(subtask)
             if prep_match:
                 packages.append(prep_match.group('subpackage'))
+            continue
 
-        pkg_match = package_re.search(str(task.target))
+        pkg_match = package_re.search(target)
         if pkg_match:
             if source_name:
                 print("Too many source packages, %s and %s, ignoring bug %s"
@@ -106,7 +126,7 @@ def process_sru_bug(lp, bugnum, task_callback, source_callback, context=None):
               "Continue? [yN] ", end="")
         sys.stdout.flush()
         response = sys.stdin.readline()
-        if not response.strip().lower().startswith('y'):
+        if response.strip()[:1].lower() != 'y':
             return
 
     full_packages = []
@@ -116,7 +136,12 @@ def process_sru_bug(lp, bugnum, task_callback, source_callback, context=None):
         elif pkg == '-lrm':
             pkg = '-restricted-modules'
 
-        real_package = re.sub(r'^linux', 'linux' + pkg, package)
+        # The pattern was an anchored literal prefix; plain string
+        # surgery does the same job without the regex engine.
+        if package.startswith('linux'):
+            real_package = 'linux' + pkg + package[len('linux'):]
+        else:
+            real_package = package
         full_packages.append(real_package)
 
     source_callback(lp, bugnum, task_results, full_packages, release, context)
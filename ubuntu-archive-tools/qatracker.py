@@ -19,13 +19,11 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
 # USA
 
-try:
-    import xmlrpc.client as xmlrpclib
-except ImportError:
-    import xmlrpclib
+import xmlrpc.client as xmlrpclib
 
 import base64
 from datetime import datetime
+from functools import lru_cache
 
 # Taken from qatracker/qatracker.modules (PHP code)
 # cat qatracker.module | grep " = array" | sed -e 's/^\$//g' \
@@ -52,38 +50,63 @@ qatracker_rebuild_status = ["Requested", "Queued", "Building", "Built",
 ### <- AUTO-GENERATED
 
 
+# Access levels that allow posting/modifying results
+_USER_ACCESS = frozenset(("user", "admin"))
+
+
+def _convert_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _convert_bool(value):
+    return value == "true"
+
+
+def _convert_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
 class QATrackerRPCObject():
     """Base class for objects received over XML-RPC"""
 
-    CONVERT_BOOL = []
-    CONVERT_DATE = []
-    CONVERT_INT = []
+    # Subclasses list the fields the server is known to return in
+    # __slots__ (plus '__dict__' so any field added server-side still
+    # binds); slot storage keeps tens of thousands of wrappers from
+    # paying per-instance dict overhead.
+    __slots__ = ('tracker',)
+
+    CONVERT_BOOL = frozenset()
+    CONVERT_DATE = frozenset()
+    CONVERT_INT = frozenset()
+
+    _FIELD_CONVERTERS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # One converter lookup per field in __init__ instead of three
+        # sequential membership scans.
+        converters = {}
+        for key in cls.CONVERT_INT:
+            converters[key] = _convert_int
+        for key in cls.CONVERT_BOOL:
+            converters[key] = _convert_bool
+        for key in cls.CONVERT_DATE:
+            converters[key] = _convert_date
+        cls._FIELD_CONVERTERS = converters
 
     def __init__(self, tracker, rpc_dict):
         # Convert the dict we get from the API into an object
 
-        for key in rpc_dict:
-            if key in self.CONVERT_INT:
-                try:
-                    setattr(self, key, int(rpc_dict[key]))
-                except ValueError:
-                    setattr(self, key, None)
-            elif key in self.CONVERT_BOOL:
-                setattr(self, key, rpc_dict[key] == "true")
-            elif key in self.CONVERT_DATE:
-                try:
-                    setattr(self, key, datetime.strptime(rpc_dict[key],
-                                                         '%Y-%m-%d %H:%M:%S'))
-                except ValueError:
-                    setattr(self, key, None)
-            else:
-                import sys
-                if sys.version_info > (3,):
-                    setattr(self, key, str(rpc_dict[key]))
-                else:
-                    setattr(self, key, unicode(rpc_dict[key]))
-
+        converters = self._FIELD_CONVERTERS
         self.tracker = tracker
+        for key, value in rpc_dict.items():
+            setattr(self, key, converters.get(key, str)(value))
 
     def __repr__(self):
         return "%s: %s" % (self.__class__.__name__, self.title)
@@ -92,8 +115,11 @@ class QATrackerRPCObject():
 class QATrackerBug(QATrackerRPCObject):
     """A bug entry"""
 
-    CONVERT_INT = ['bugnumber', 'count']
-    CONVERT_DATE = ['earliest_report', 'latest_report']
+    __slots__ = ('bugnumber', 'count', 'earliest_report', 'latest_report',
+                 'title', '__dict__')
+
+    CONVERT_INT = frozenset(['bugnumber', 'count'])
+    CONVERT_DATE = frozenset(['earliest_report', 'latest_report'])
 
     def __repr__(self):
         return "%s: %s" % (self.__class__.__name__, self.bugnumber)
@@ -102,8 +128,11 @@ class QATrackerBug(QATrackerRPCObject):
 class QATrackerBuild(QATrackerRPCObject):
     """A build entry"""
 
-    CONVERT_INT = ['id', 'productid', 'userid', 'status']
-    CONVERT_DATE = ['date']
+    __slots__ = ('id', 'productid', 'userid', 'status', 'date', 'version',
+                 'note', 'status_string', '__dict__')
+
+    CONVERT_INT = frozenset(['id', 'productid', 'userid', 'status'])
+    CONVERT_DATE = frozenset(['date'])
 
     def __repr__(self):
         return "%s: %s" % (self.__class__.__name__, self.id)
@@ -111,7 +140,7 @@ class QATrackerBuild(QATrackerRPCObject):
     def add_result(self, testcase, result, comment='', hardware='', bugs={}):
         """Add a result to the build"""
 
-        if (self.tracker.access not in ("user", "admin") and
+        if (self.tracker.access not in _USER_ACCESS and
                 self.tracker.access is not None):
             raise Exception("Access denied, you need 'user' but are '%s'" %
                             self.tracker.access)
@@ -152,16 +181,19 @@ class QATrackerBuild(QATrackerRPCObject):
         if resultid == -1:
             raise Exception("Couldn't post your result.")
 
-        new_result = None
-        for entry in self.get_results(build_testcase, 0):
-            if entry.id == resultid:
-                new_result = entry
-                break
-
-        return new_result
+        # Find the row we just added without materialising a wrapper for
+        # every other result on the build.
+        return next(
+            (QATrackerResult(self.tracker, entry)
+             for entry in self.tracker.tracker.results.get_list(
+                 self.id, build_testcase, [0])
+             if int(entry['id']) == resultid), None)
 
     def get_results(self, testcase, status=qatracker_result_status):
-        """Get a list of results for the given build and testcase"""
+        """Get an iterable of results for the given build and testcase
+
+        Returns a generator so large result sets are wrapped lazily;
+        wrap in list() if random access is needed."""
 
         build_testcase = None
 
@@ -181,28 +213,24 @@ class QATrackerBuild(QATrackerRPCObject):
         if len(record_filter) == 0:
             return []
 
-        results = []
-        for entry in self.tracker.tracker.results.get_list(
-                self.id, build_testcase, list(record_filter)):
-            results.append(QATrackerResult(self.tracker, entry))
-
-        return results
+        return (QATrackerResult(self.tracker, entry)
+                for entry in self.tracker.tracker.results.get_list(
+                    self.id, build_testcase, list(record_filter)))
 
 
 class QATrackerMilestone(QATrackerRPCObject):
     """A milestone entry"""
 
-    CONVERT_INT = ['id', 'status', 'series']
-    CONVERT_BOOL = ['notify']
+    __slots__ = ('id', 'status', 'series', 'notify', 'title', '__dict__')
 
-    def get_bugs(self):
-        """Returns a list of all bugs linked to this milestone"""
+    CONVERT_INT = frozenset(['id', 'status', 'series'])
+    CONVERT_BOOL = frozenset(['notify'])
 
-        bugs = []
-        for entry in self.tracker.tracker.bugs.get_list(self.id):
-            bugs.append(QATrackerBug(self.tracker, entry))
+    def get_bugs(self):
+        """Returns an iterable of all bugs linked to this milestone"""
 
-        return bugs
+        return (QATrackerBug(self.tracker, entry)
+                for entry in self.tracker.tracker.bugs.get_list(self.id))
 
     def add_build(self, product, version, note="", notify=True):
         """Add a build to the milestone"""
@@ -217,18 +245,17 @@ class QATrackerMilestone(QATrackerRPCObject):
         if not isinstance(notify, bool):
             raise TypeError("notify must be a boolean")
 
-        build_product = None
-
         if isinstance(product, QATrackerProduct):
             build_product = product
         else:
             valid_products = self.tracker.get_products(0)
 
-            for entry in valid_products:
-                if (entry.title.lower() == str(product).lower() or
-                        entry.id == product):
-                    build_product = entry
-                    break
+            products_by_name = dict((entry.title.lower(), entry)
+                                    for entry in valid_products)
+            products_by_id = dict((entry.id, entry)
+                                  for entry in valid_products)
+            build_product = products_by_name.get(
+                str(product).lower(), products_by_id.get(product))
 
         if not build_product:
             raise IndexError("Couldn't find product: %s" % product)
@@ -239,17 +266,16 @@ class QATrackerMilestone(QATrackerRPCObject):
         self.tracker.tracker.builds.add(build_product.id, self.id,
                                         str(version), str(note), notify)
 
-        new_build = None
-        for entry in self.get_builds(0):
-            if (entry.productid == build_product.id
-                    and entry.version == str(version)):
-                new_build = entry
-                break
-
-        return new_build
+        # Find the row we just added without materialising a wrapper for
+        # every other build on the milestone.
+        return next(
+            (QATrackerBuild(self.tracker, entry)
+             for entry in self.tracker.tracker.builds.get_list(self.id, [0])
+             if (int(entry['productid']) == build_product.id
+                 and str(entry['version']) == str(version))), None)
 
     def get_builds(self, status=qatracker_build_milestone_status):
-        """Get a list of builds for the milestone"""
+        """Get an iterable of builds for the milestone"""
 
         record_filter = self.tracker._get_valid_id_list(
             qatracker_build_milestone_status, status)
@@ -257,16 +283,15 @@ class QATrackerMilestone(QATrackerRPCObject):
         if len(record_filter) == 0:
             return []
 
-        builds = []
-        for entry in self.tracker.tracker.builds.get_list(self.id,
-                                                          list(record_filter)):
-            builds.append(QATrackerBuild(self.tracker, entry))
-
-        return builds
+        return (QATrackerBuild(self.tracker, entry)
+                for entry in self.tracker.tracker.builds.get_list(
+                    self.id, list(record_filter)))
 
 
 class QATrackerProduct(QATrackerRPCObject):
-    CONVERT_INT = ['id', 'type', 'status']
+
+    __slots__ = ('id', 'type', 'status', 'title', '__dict__')
+    CONVERT_INT = frozenset(['id', 'type', 'status'])
 
     def get_testcases(self, series,
                       status=qatracker_testsuite_testcase_status):
@@ -295,9 +320,12 @@ class QATrackerProduct(QATrackerRPCObject):
 
 
 class QATrackerRebuild(QATrackerRPCObject):
-    CONVERT_INT = ['id', 'seriesid', 'productid', 'milestoneid', 'requestedby',
-                   'changedby', 'status']
-    CONVERT_DATE = ['requestedat', 'changedat']
+
+    __slots__ = ('id', 'seriesid', 'productid', 'milestoneid', 'requestedby',
+                 'changedby', 'status', 'requestedat', 'changedat', '__dict__')
+    CONVERT_INT = frozenset(['id', 'seriesid', 'productid', 'milestoneid', 'requestedby',
+                   'changedby', 'status'])
+    CONVERT_DATE = frozenset(['requestedat', 'changedat'])
 
     def __repr__(self):
         return "%s: %s" % (self.__class__.__name__, self.id)
@@ -320,9 +348,13 @@ class QATrackerRebuild(QATrackerRPCObject):
 
 
 class QATrackerResult(QATrackerRPCObject):
-    CONVERT_INT = ['id', 'reporterid', 'revisionid', 'result', 'changedby',
-                   'status']
-    CONVERT_DATE = ['date', 'lastchange']
+
+    __slots__ = ('id', 'reporterid', 'revisionid', 'result', 'changedby',
+                 'status', 'date', 'lastchange', 'comment', 'hardware',
+                 'bugs', '__dict__')
+    CONVERT_INT = frozenset(['id', 'reporterid', 'revisionid', 'result', 'changedby',
+                   'status'])
+    CONVERT_DATE = frozenset(['date', 'lastchange'])
     __deleted = False
 
     def __repr__(self):
@@ -331,7 +363,7 @@ class QATrackerResult(QATrackerRPCObject):
     def delete(self):
         """Remove the result from the tracker"""
 
-        if (self.tracker.access not in ("user", "admin") and
+        if (self.tracker.access not in _USER_ACCESS and
                 self.tracker.access is not None):
             raise Exception("Access denied, you need 'user' but are '%s'" %
                             self.tracker.access)
@@ -349,7 +381,7 @@ class QATrackerResult(QATrackerRPCObject):
     def save(self):
         """Save any change that happened on this entry"""
 
-        if (self.tracker.access not in ("user", "admin") and
+        if (self.tracker.access not in _USER_ACCESS and
                 self.tracker.access is not None):
             raise Exception("Access denied, you need 'user' but are '%s'" %
                             self.tracker.access)
@@ -368,7 +400,9 @@ class QATrackerResult(QATrackerRPCObject):
 
 
 class QATrackerSeries(QATrackerRPCObject):
-    CONVERT_INT = ['id', 'status']
+
+    __slots__ = ('id', 'status', 'title', '__dict__')
+    CONVERT_INT = frozenset(['id', 'status'])
 
     def get_manifest(self, status=qatracker_milestone_series_manifest_status):
         """Get a list of products in the series' manifest"""
@@ -389,39 +423,43 @@ class QATrackerSeries(QATrackerRPCObject):
 
 
 class QATrackerSeriesManifest(QATrackerRPCObject):
-    CONVERT_INT = ['id', 'productid', 'status']
+
+    __slots__ = ('id', 'productid', 'status', 'product_title', 'title',
+                 '__dict__')
+    CONVERT_INT = frozenset(['id', 'productid', 'status'])
 
     def __repr__(self):
         return "%s: %s" % (self.__class__.__name__, self.product_title)
 
 
 class QATrackerTestcase(QATrackerRPCObject):
-    CONVERT_INT = ['id', 'status', 'weight', 'suite']
+
+    __slots__ = ('id', 'status', 'weight', 'suite', 'title', '__dict__')
+    CONVERT_INT = frozenset(['id', 'status', 'weight', 'suite'])
+
+
+class _AuthTransport(xmlrpclib.Transport):
+    """Transport adding a basic-auth header to every request"""
+
+    def set_auth(self, auth):
+        self.auth = auth
+
+    def get_host_info(self, host):
+        host, extra_headers, x509 = \
+            xmlrpclib.Transport.get_host_info(self, host)
+        if extra_headers is None:
+            extra_headers = []
+        extra_headers.append(('Authorization', 'Basic %s' % self.auth))
+        return host, extra_headers, x509
 
 
 class QATracker():
     def __init__(self, url, username=None, password=None):
-        class AuthTransport(xmlrpclib.Transport):
-            def set_auth(self, auth):
-                self.auth = auth
-
-            def get_host_info(self, host):
-                host, extra_headers, x509 = \
-                    xmlrpclib.Transport.get_host_info(self, host)
-                if extra_headers is None:
-                    extra_headers = []
-                extra_headers.append(('Authorization', 'Basic %s' % auth))
-                return host, extra_headers, x509
-
         if username and password:
-            try:
-                auth = str(base64.b64encode(
-                           bytes('%s:%s' % (username, password), 'utf-8')),
-                           'utf-8')
-            except TypeError:
-                auth = base64.b64encode('%s:%s' % (username, password))
-
-            transport = AuthTransport()
+            auth = base64.b64encode(
+                ('%s:%s' % (username, password)).encode()).decode('ascii')
+
+            transport = _AuthTransport()
             transport.set_auth(auth)
             drupal = xmlrpclib.ServerProxy(url, transport=transport)
         else:
@@ -434,6 +472,49 @@ class QATracker():
         self.access = drupal.qatracker.get_access()
 
         self.tracker = drupal.qatracker
+        # Keep the proxy itself around for system.multicall batching
+        self._proxy = drupal
+
+    def get_all(self, milestone_status=qatracker_milestone_status,
+                product_status=qatracker_product_status,
+                rebuild_status=None, series_status=None):
+        """Fetch several collections in one batched XML-RPC request.
+
+        Each keyword argument carries the status filter for its
+        collection; pass None to skip a collection entirely.  Returns a
+        dict mapping collection name ('milestones', 'products',
+        'rebuilds', 'series') to its list of objects.  Batching saves
+        one HTTP round-trip (and authentication) per extra collection."""
+
+        wanted = []
+        if milestone_status is not None:
+            wanted.append(('milestones', qatracker_milestone_status,
+                           milestone_status, QATrackerMilestone))
+        if product_status is not None:
+            wanted.append(('products', qatracker_product_status,
+                           product_status, QATrackerProduct))
+        if rebuild_status is not None:
+            wanted.append(('rebuilds', qatracker_rebuild_status,
+                           rebuild_status, QATrackerRebuild))
+        if series_status is not None:
+            wanted.append(('series', qatracker_milestone_series_status,
+                           series_status, QATrackerSeries))
+
+        results = dict((name, []) for name, _, _, _ in wanted)
+        multicall = xmlrpclib.MultiCall(self._proxy)
+        queued = []
+        for name, status_list, status, wrapper in wanted:
+            record_filter = self._get_valid_id_list(status_list, status)
+            if len(record_filter) == 0:
+                continue
+            getattr(multicall.qatracker, name).get_list(list(record_filter))
+            queued.append((name, wrapper))
+
+        if queued:
+            for (name, wrapper), entries in zip(queued, multicall()):
+                results[name] = [wrapper(self, entry) for entry in entries]
+
+        return results
 
     def _get_valid_id_list(self, status_list, status):
         """ Get a list of valid keys and a list or just a single
@@ -442,6 +523,16 @@ class QATracker():
             case insensitive checking for strings and returns a list
             of indexes for the list of valid keys. """
 
+        if not isinstance(status, (list, tuple)):
+            status = (status,)
+        return list(self._valid_ids_cached(tuple(status_list), tuple(status)))
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _valid_ids_cached(status_list, status):
+        # The status lists are the handful of module-level constants and
+        # the requested filter is nearly always a default, so the whole
+        # validation collapses to a cache hit after the first call.
         def process(status_list, status):
             valid_status = [entry.lower() for entry in status_list]
 
@@ -460,23 +551,16 @@ class QATracker():
                             type(status))
 
         record_filter = set()
+        for entry in status:
+            record_filter.add(process(status_list, entry))
 
-        if isinstance(status, list):
-            for entry in status:
-                record_filter.add(process(status_list, entry))
-        else:
-            record_filter.add(process(status_list, status))
-
-        return list(record_filter)
+        return tuple(record_filter)
 
     def get_bugs(self):
-        """Get a list of all bugs reported on the site"""
-
-        bugs = []
-        for entry in self.tracker.bugs.get_list(0):
-            bugs.append(QATrackerBug(self, entry))
+        """Get an iterable of all bugs reported on the site"""
 
-        return bugs
+        return (QATrackerBug(self, entry)
+                for entry in self.tracker.bugs.get_list(0))
 
     def get_milestones(self, status=qatracker_milestone_status):
         """Get a list of all milestones"""
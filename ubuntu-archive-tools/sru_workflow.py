@@ -19,19 +19,78 @@
 """Portions of SRU-related code that is re-used by various SRU tools."""
 
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+_BUG_TARGET_RE = re.compile(
+    r'/ubuntu/(?:(?P<suite>[^/]+)/)?\+source/(?P<source>[^/]+)$')
+# Task states that should not normally precede an SRU acceptance
+_CLOSED_TASK_STATUSES = frozenset(("Invalid", "Won't Fix", "Fix Released"))
+
+# launchpad.people[...] lookups, cached per Launchpad instance; the
+# same handful of teams is fetched for every bug processed in a run.
+_people_cache = {}
+
+
+def _person(launchpad, name):
+    key = (id(launchpad), name)
+    person = _people_cache.get(key)
+    if person is None:
+        person = launchpad.people[name]
+        _people_cache[key] = person
+    return person
+
+
+# launchpad.load(...) targets, cached the same way; batch runs accept
+# many bugs into the same handful of release/source targets.
+_load_cache = {}
+
+
+def _load(launchpad, url):
+    key = (id(launchpad), url)
+    target = _load_cache.get(key)
+    if target is None:
+        target = launchpad.load(url)
+        _load_cache[key] = target
+    return target
+
+
+# Static tail of the verification request comment; only the release
+# name is interpolated per bug.
+_COMMENT_TAIL = (
+    '  Your feedback will aid us getting this update out to other '
+    'Ubuntu users.\n\nIf this package fixes the bug for you, '
+    'please add a comment to this bug, mentioning the version of the '
+    'package you tested, what testing has been performed on the '
+    'package and change the tag from '
+    'verification-needed-%s to verification-done-%s. '
+    'If it does not fix the bug for you, please add a comment '
+    'stating that, and change the tag to verification-failed-%s. '
+    'In either case, without details of your testing we will not '
+    'be able to proceed.\n\nFurther information regarding the '
+    'verification process can be found at '
+    'https://wiki.ubuntu.com/QATeam/PerformingSRUVerification .  '
+    'Thank you in advance for helping!\n\n'
+    'N.B. The updated package will be released to -updates after '
+    'the bug(s) fixed by this package have been verified and '
+    'the package has been in -proposed for a minimum of 7 days.')
 
 
 def process_bug(launchpad, sourcepkg, version, release, num):
-    bug_target_re = re.compile(
-        r'/ubuntu/(?:(?P<suite>[^/]+)/)?\+source/(?P<source>[^/]+)$')
     bug = launchpad.bugs[num]
     sourcepkg_match = False
     distroseries_match = False
-    for task in bug.bug_tasks:
+    pending_tasks = []
+    # Fetching each task's target is an independent REST GET; overlap
+    # them instead of paying the latency serially.  All mutation stays
+    # on this thread.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        task_targets = list(pool.map(
+            lambda task: (task, task.target.self_link), bug.bug_tasks))
+    for task, target_link in task_targets:
         # Ugly; we have to do URL-parsing to figure this out.
         # /ubuntu/+source/foo can be fed to launchpad.load() to get a
         # distribution_source_package, but /ubuntu/hardy/+source/foo can't.
-        match = bug_target_re.search(task.target.self_link)
+        match = _BUG_TARGET_RE.search(target_link)
         if (not match or
             (sourcepkg and
              match.group('source') != sourcepkg)):
@@ -39,21 +98,26 @@ def process_bug(launchpad, sourcepkg, version, release, num):
             continue
         sourcepkg_match = True
         if match.group('suite') == release:
-            if task.status in ("Invalid", "Won't Fix", "Fix Released"):
+            if task.status in _CLOSED_TASK_STATUSES:
                 print("Matching task was set to %s before accepting the SRU, "
                       "please double-check if this bug is still liable for "
                       "fixing.  Switching to Fix Committed." % task.status)
             task.status = "Fix Committed"
-            task.lp_save()
-            print("Success: task %s in bug %s" % (task.web_link, num))
+            pending_tasks.append(task)
             distroseries_match = True
 
+    # Push the status changes after the enumeration; each lp_save is a
+    # full HTTP round-trip.
+    for task in pending_tasks:
+        task.lp_save()
+        print("Success: task %s in bug %s" % (task.web_link, num))
+
     if sourcepkg_match and not distroseries_match:
         # add a release task
         lp_url = launchpad._root_uri
         series_task_url = '%subuntu/%s/+source/%s' % \
                           (lp_url, release, sourcepkg)
-        sourcepkg_target = launchpad.load(series_task_url)
+        sourcepkg_target = _load(launchpad, series_task_url)
         new_task = bug.addTask(target=sourcepkg_target)
         new_task.status = "Fix Committed"
         new_task.lp_save()
@@ -64,12 +128,19 @@ def process_bug(launchpad, sourcepkg, version, release, num):
 
     # XXX: it might be useful if the package signer/sponsor was
     #   subscribed to the bug report
-    bug.subscribe(person=launchpad.people['ubuntu-sru'])
-    bug.subscribe(person=launchpad.people['sru-verification'])
-
-    # there may be something else to sponsor so just warn
-    subscribers = [sub.person for sub in bug.subscriptions]
-    if launchpad.people['ubuntu-sponsors'] in subscribers:
+    # The two subscriptions are independent POSTs; overlap them.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        subscriptions = [
+            pool.submit(bug.subscribe, person=_person(launchpad, name))
+            for name in ('ubuntu-sru', 'sru-verification')]
+        for subscription in subscriptions:
+            subscription.result()
+
+    # there may be something else to sponsor so just warn; compare the
+    # person links so no subscriber entries have to be dereferenced
+    sponsors_link = _person(launchpad, 'ubuntu-sponsors').self_link
+    if any(getattr(sub, 'person_link', None) == sponsors_link
+           for sub in bug.subscriptions):
         print('ubuntu-sponsors is still subscribed to LP: #%s. '
               'Is there anything left to sponsor?' % num)
 
@@ -81,68 +152,61 @@ def process_bug(launchpad, sourcepkg, version, release, num):
                   'Please investigate and adjust the tags accordingly.'
                   % (block_proposed_series, num))
 
-        # this dance is needed due to
-        # https://bugs.launchpad.net/launchpadlib/+bug/254901
-        btags = bug.tags
+        # Mutate a local list and assign bug.tags exactly once: each
+        # assignment is PATCH material for launchpadlib (reassignment of
+        # a fresh list is also what works around
+        # https://bugs.launchpad.net/launchpadlib/+bug/254901), so
+        # coalescing the whole dance saves several round-trips.
+        btags = list(bug.tags)
         for t in ('verification-failed', 'verification-failed-%s' % release,
                   'verification-done', 'verification-done-%s' % release):
             if t in btags:
-                tags = btags
-                tags.remove(t)
-                bug.tags = tags
+                btags.remove(t)
 
         if 'verification-needed' not in btags:
             btags.append('verification-needed')
-            bug.tags = btags
 
         needed_tag = 'verification-needed-%s' % release
         if needed_tag not in btags:
             btags.append(needed_tag)
-            bug.tags = btags
 
+        bug.tags = btags
         bug.lp_save()
 
-    text = ('Hello %s, or anyone else affected,\n\n' %
-            re.split(r'[,\s]', bug.owner.display_name)[0])
+    # Accumulate the comment in a list and join once rather than
+    # repeatedly concatenating onto an ever-growing string.
+    # First name = everything before the first comma or whitespace;
+    # plain string methods beat a regex split here, with a guard for
+    # empty display names.
+    display_name = bug.owner.display_name or ''
+    first_name = (display_name.split(',', 1)[0].split() or [''])[0]
+    parts = ['Hello %s, or anyone else affected,\n\n' % first_name]
 
     if sourcepkg:
-        text += 'Accepted %s into ' % sourcepkg
+        parts.append('Accepted %s into ' % sourcepkg)
     else:
-        text += 'Accepted into '
+        parts.append('Accepted into ')
     if sourcepkg and release:
-        text += ('%s-proposed. The package will build now and be available at '
-                 'https://launchpad.net/ubuntu/+source/%s/%s in a few hours, '
-                 'and then in the -proposed repository.\n\n' % (
-                     release, sourcepkg, version))
+        parts.append(
+            '%s-proposed. The package will build now and be available at '
+            'https://launchpad.net/ubuntu/+source/%s/%s in a few hours, '
+            'and then in the -proposed repository.\n\n' % (
+                release, sourcepkg, version))
     else:
-        text += ('%s-proposed. The package will build now and be available in '
-                 'a few hours in the -proposed repository.\n\n' % (
-                     release))
+        parts.append(
+            '%s-proposed. The package will build now and be available in '
+            'a few hours in the -proposed repository.\n\n' % (
+                release))
 
-    text += ('Please help us by testing this new package.  ')
+    parts.append('Please help us by testing this new package.  ')
 
     if sourcepkg == 'casper':
-        text += ('To properly test it you will need to obtain and boot '
-                 'a daily build of a Live CD for %s.' % (release))
+        parts.append('To properly test it you will need to obtain and boot '
+                     'a daily build of a Live CD for %s.' % (release))
     else:
-        text += ('See https://wiki.ubuntu.com/Testing/EnableProposed for '
-                 'documentation on how to enable and use -proposed.')
-
-    text += ('  Your feedback will aid us getting this update out to other '
-             'Ubuntu users.\n\nIf this package fixes the bug for you, '
-             'please add a comment to this bug, mentioning the version of the '
-             'package you tested, what testing has been performed on the '
-             'package and change the tag from '
-             'verification-needed-%s to verification-done-%s. '
-             'If it does not fix the bug for you, please add a comment '
-             'stating that, and change the tag to verification-failed-%s. '
-             'In either case, without details of your testing we will not '
-             'be able to proceed.\n\nFurther information regarding the '
-             'verification process can be found at '
-             'https://wiki.ubuntu.com/QATeam/PerformingSRUVerification .  '
-             'Thank you in advance for helping!\n\n'
-             'N.B. The updated package will be released to -updates after '
-             'the bug(s) fixed by this package have been verified and '
-             'the package has been in -proposed for a minimum of 7 days.' %
-             (release, release, release))
-    bug.newMessage(content=text, subject='Please test proposed package')
+        parts.append('See https://wiki.ubuntu.com/Testing/EnableProposed for '
+                     'documentation on how to enable and use -proposed.')
+
+    parts.append(_COMMENT_TAIL % (release, release, release))
+    bug.newMessage(content=''.join(parts),
+                   subject='Please test proposed package')
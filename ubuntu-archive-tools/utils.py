@@ -1,4 +1,4 @@
-#!/usr/bin/python2.7
+#!/usr/bin/python3
 
 # Copyright (C) 2019 Canonical Ltd.
 # Author: Brian Murray <brian.murray@canonical.com>
@@ -18,38 +18,201 @@
 """Portions of archive related code that is re-used by various tools."""
 
 import gzip
+import io
 import os
-import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import apt_pkg
 
+try:
+    # Optional accelerator: decodes Deflate blocks on multiple threads.
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
 
-def read_tag_file(path, pkg=None):
-    tmp = tempfile.NamedTemporaryFile(prefix='checkrdepends.', delete=False)
+try:
+    # Optional accelerator: ISA-L's vectorized single-threaded inflate,
+    # preferred over zlib when rapidgzip is not available.
+    from isal import igzip
+except ImportError:
+    igzip = None
+
+
+def _fadvise_sequential(path):
+    """Hint the kernel to read path ahead sequentially.
+
+    POSIX_FADV_WILLNEED starts asynchronous readahead into the page
+    cache, so decompression is not stalled on the first disk reads."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
     try:
-        compressed = gzip.open(path)
-        try:
-            tmp.write(compressed.read())
-        finally:
-            compressed.close()
-        tmp.close()
-        with open(tmp.name) as uncompressed:
-            tag_file = apt_pkg.TagFile(uncompressed)
-            prev_name = None
-            prev_stanza = None
-            for stanza in tag_file:
-                try:
-                    name = stanza['package']
-                except KeyError:
-                    continue
-                if pkg:
-                    if name != pkg:
-                        continue
-                if name != prev_name and prev_stanza is not None:
-                    yield prev_stanza
-                prev_name = name
-                prev_stanza = stanza
-            if prev_stanza is not None:
-                yield prev_stanza
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except (AttributeError, OSError):
+        pass
     finally:
-        os.unlink(tmp.name)
+        os.close(fd)
+
+
+def _open_compressed(path):
+    _fadvise_sequential(path)
+    if rapidgzip is not None:
+        # parallelization=0 sizes the worker pool to the machine
+        return rapidgzip.open(path, parallelization=0)
+    if igzip is not None:
+        return igzip.open(path, 'rb')
+    return gzip.open(path, 'rb')
+
+
+# Decompressed archive payloads, keyed by path and invalidated on
+# mtime/size change; tools commonly re-read the same Packages file for
+# several different packages.  Capped so batch runs over many archives
+# do not accumulate every payload.
+_payload_cache = {}
+_PAYLOAD_CACHE_ENTRIES = 4
+
+
+def _gzip_size_hint(path):
+    """Uncompressed size from the gzip ISIZE trailer.
+
+    ISIZE is the size modulo 2**32, so treat it strictly as a hint."""
+    try:
+        with open(path, 'rb') as raw:
+            raw.seek(-4, os.SEEK_END)
+            return int.from_bytes(raw.read(4), 'little')
+    except OSError:
+        return 0
+
+
+def _read_compressed(path):
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    cached = _payload_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    # Decompress into a buffer presized from the trailer so the read
+    # does a single allocation instead of geometric grow-and-copy
+    # cycles.  A shared scratch buffer would be cheaper still, but the
+    # payload cache needs each file's bytes to stay independent.
+    size_hint = _gzip_size_hint(path)
+    with _open_compressed(path) as compressed:
+        if size_hint:
+            scratch = bytearray(size_hint)
+            n = compressed.readinto(scratch)
+            tail = compressed.read()
+            if n == size_hint and not tail:
+                buf = bytes(scratch)
+            else:
+                # Short read or a payload past 4 GiB wrapping ISIZE
+                buf = bytes(scratch[:n]) + tail
+        else:
+            buf = compressed.read()
+    while len(_payload_cache) >= _PAYLOAD_CACHE_ENTRIES:
+        del _payload_cache[next(iter(_payload_cache))]
+    _payload_cache[path] = (key, buf)
+    return buf
+
+
+class _ReadOnly:
+    """Expose just a file object's read method.
+
+    TagFile prefers an object's fileno(), which for a decompressor is
+    the descriptor of the *compressed* stream; hiding everything but
+    read() forces it down the streaming path."""
+
+    def __init__(self, fileobj):
+        self.read = fileobj.read
+
+
+# Package-name -> stanza-bounds indexes, keyed by path and tied to the
+# identity of the cached payload they were built from.
+_index_cache = {}
+
+
+def _stanza_index(path, buf):
+    """Map each package name in buf to its last stanza's bounds.
+
+    Built with bytes.find — a C-level memory scan, far cheaper than
+    having TagFile materialize a section per stanza — and cached so
+    repeated lookups against the same payload are O(1).  Later entries
+    override earlier ones, hence last wins."""
+    cached = _index_cache.get(path)
+    if cached and cached[0] is buf:
+        return cached[1]
+    index = {}
+    needle = b'Package: '
+    pos = buf.find(needle)
+    while pos != -1:
+        # Only accept the field at the start of a line
+        if pos == 0 or buf[pos - 1:pos] == b'\n':
+            name_end = buf.find(b'\n', pos)
+            if name_end == -1:
+                name_end = len(buf)
+            start = buf.rfind(b'\n\n', 0, pos)
+            start = 0 if start == -1 else start + 2
+            end = buf.find(b'\n\n', pos)
+            end = len(buf) - 1 if end == -1 else end
+            name = buf[pos + len(needle):name_end].decode()
+            index[name] = (start, end + 1)
+            pos = buf.find(needle, end)
+        else:
+            pos = buf.find(needle, pos + 1)
+    _index_cache[path] = (buf, index)
+    return index
+
+
+def _read_one(path, pkg):
+    # Single-package lookup: index the raw bytes once and parse just
+    # the matching section.
+    buf = _read_compressed(path)
+    bounds = _stanza_index(path, buf).get(pkg)
+    if bounds is not None:
+        yield apt_pkg.TagSection(buf[bounds[0]:bounds[1]])
+
+
+def _read_all(path):
+    # Later stanzas override earlier ones, so collect the last stanza
+    # per name in a dict; this also handles duplicates that are not
+    # adjacent, which the old previous-stanza bookkeeping missed.
+    tag_file = apt_pkg.TagFile(_ReadOnly(io.BytesIO(_read_compressed(path))))
+    latest = {}
+    for stanza in tag_file:
+        # find() skips the exception machinery [] would pay on the
+        # odd stanza without a Package field
+        name = stanza.find('Package')
+        if not name:
+            continue
+        # TagFile reuses its section object while iterating, so take a
+        # copy before retaining a reference.
+        latest[name] = apt_pkg.TagSection(str(stanza))
+    for stanza in latest.values():
+        yield stanza
+
+
+def read_tag_file(path, pkg=None):
+    # Dispatch once instead of testing pkg inside the hot loop
+    return _read_one(path, pkg) if pkg else _read_all(path)
+
+
+def _read_sections(path, pkg):
+    # Worker for read_tag_files; TagSection objects do not pickle, so
+    # ship the raw section text back to the parent.
+    return [str(stanza) for stanza in read_tag_file(path, pkg)]
+
+
+def read_tag_files(paths, pkg=None):
+    """Read several tag files in parallel worker processes.
+
+    Decompression and parsing are CPU-bound, so farming each path out
+    to its own process sidesteps the GIL; stanzas are yielded as each
+    file completes, so output order follows completion, not the input
+    sequence.
+    """
+    with ProcessPoolExecutor() as executor:
+        futures = [executor.submit(_read_sections, path, pkg)
+                   for path in paths]
+        for future in as_completed(futures):
+            for section in future.result():
+                yield apt_pkg.TagSection(section)